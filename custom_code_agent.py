@@ -1,18 +1,62 @@
 import os
 import sys
+import atexit
+import hashlib
+import argparse
+import asyncio
 import subprocess
+import importlib.util
+
+import httpx
 from dotenv import load_dotenv
 from typing import Type, List
 
-from pydantic import BaseModel, Field 
+from pydantic import BaseModel, Field, PrivateAttr
 
 from langchain_core.tools import BaseTool
-from langchain_core.prompts import PromptTemplate
-from langchain.agents import AgentExecutor, create_react_agent
+from langchain_core.callbacks import StreamingStdOutCallbackHandler
+from langchain_core.caches import InMemoryCache
+from langchain_core.globals import set_llm_cache
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain_groq import ChatGroq
 
+from python_worker import ECHO, WorkerPool
+
 load_dotenv()
 
+async def ainput(prompt: str) -> str:
+    """Reads a line from the user without blocking the event loop.
+
+    On a POSIX terminal the loop waits for stdin to become readable, so Ctrl-C still interrupts at once and
+    no executor thread is left blocked in input(). Piped stdin and loops without `add_reader` (Windows) fall
+    back to a plain input(), which does not wait on a person there.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        fd = sys.stdin.fileno()
+        interactive = os.isatty(fd)
+    except (AttributeError, ValueError, OSError):
+        interactive = False
+    if not interactive:
+        return input(prompt)
+
+    ready = loop.create_future()
+    try:
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+    except NotImplementedError:
+        return input(prompt)
+    print(prompt, end="", flush=True)
+    try:
+        await ready
+    finally:
+        loop.remove_reader(fd)
+
+    line = sys.stdin.readline()
+    if not line:
+        raise EOFError
+    return line.rstrip("\n")
+
 #1. Define the Custom Tool 
 class PythonCodeExecutorToolInput(BaseModel):
     code: str = Field(description="The Python code to execute. It should be a complete, runnable script without any markdown formatting.")
@@ -27,20 +71,52 @@ class PythonCodeExecutorTool(BaseTool):
         "Ensure the Python code is self-contained and prints any results to standard output (e.g., using `print(result)`)."
     )
     args_schema: Type[BaseModel] = PythonCodeExecutorToolInput
+    auto_approve: bool = False
+    _approved: set = PrivateAttr(default_factory=set)
+    _workers: WorkerPool = PrivateAttr(default_factory=WorkerPool)
+    _confirm_lock: asyncio.Lock = PrivateAttr(default_factory=asyncio.Lock)
 
     def _clean_code(self, code_input: str) -> str:
         """Removes common markdown fences and leading/trailing whitespace."""
+        if "```" not in code_input:
+            return code_input.strip()
         code = code_input.strip()
-    
-        if code.startswith("```python"):
-            code = code[len("```python"):].strip()
+        code = code.removeprefix("```python").removeprefix("```").removesuffix("```")
+        return code.strip()
+
+    def _format_result(self, stdout: str, stderr: str, returncode: int) -> str:
+        """Builds the observation message from the captured output of a finished run."""
+        stdout, stderr = stdout.strip(), stderr.strip()
+        if stdout and stderr:
+            return f"Standard Output:\n{stdout}\nStandard Error:\n{stderr}"
+        if stderr:
+            return f"Standard Error:\n{stderr}"
+        if stdout and returncode != 0:
+            return f"Standard Output:\n{stdout}\nCode execution finished with return code: {returncode}"
+        if stdout:
+            return f"Standard Output:\n{stdout}"
+        if returncode != 0:
+            return f"Code execution failed with return code {returncode} and no specific error message."
+        return "Code executed successfully with no output to stdout or stderr."
+
+    def _is_approved(self, cleaned_code: str) -> bool:
+        """Checks whether the code may run without asking: auto-approve is on or the same code was approved earlier."""
+        return self.auto_approve or self._code_hash(cleaned_code) in self._approved
+
+    def _code_hash(self, cleaned_code: str) -> str:
+        """Returns the key under which approved code is remembered for the session."""
+        return hashlib.blake2b(cleaned_code.encode(), digest_size=16).hexdigest()
+
+    def _execute(self, cleaned_code: str) -> str:
+        """Runs already confirmed code on a persistent worker and formats the observation."""
+        try:
+            stdout, stderr, returncode = self._workers.execute(cleaned_code, timeout=60, echo=True)
+            return self._format_result(stdout, stderr, returncode)
 
-        elif code.startswith("```"):
-            code = code[len("```"):].strip()
-        
-        if code.endswith("```"):
-            code = code[:-len("```")].strip()
-        return code
+        except subprocess.TimeoutExpired:
+            return "Error: Code execution timed out after 60 seconds."
+        except Exception as e:
+            return f"An unexpected error occurred during Python code execution: {str(e)}"
 
     def _run(self, code: str) -> str: 
         """Executes the python code after cleaning and returns stdout/stderr."""
@@ -55,44 +131,40 @@ class PythonCodeExecutorTool(BaseTool):
             return "Error: No valid Python code provided after cleaning. The input might have been empty or only markdown."
 
      
-        confirm = input(f"Do you want to execute this cleaned code? [y/N]: ")
-        if confirm.lower() != 'y':
-            return "Code execution CANCELED by user."
+        if not self._is_approved(cleaned_code):
+            confirm = input(f"Do you want to execute this cleaned code? [y/N]: ")
+            if confirm.lower() != 'y':
+                return "Code execution CANCELED by user."
+            self._approved.add(self._code_hash(cleaned_code))
 
-        try:
-            process = subprocess.run(
-                [sys.executable, '-c', cleaned_code],
-                capture_output=True,
-                text=True,
-                timeout=60, 
-                check=False 
-            )
-
-            output_parts = []
-            if process.stdout:
-                output_parts.append(f"Standard Output:\n{process.stdout.strip()}")
-            if process.stderr:
-                output_parts.append(f"Standard Error:\n{process.stderr.strip()}")
-            
-            result_message = "\n".join(output_parts)
-
-            if not result_message and process.returncode == 0:
-                result_message = "Code executed successfully with no output to stdout or stderr."
-            elif not result_message and process.returncode != 0:
-                result_message = f"Code execution failed with return code {process.returncode} and no specific error message."
-            elif process.returncode != 0 and "Standard Error" not in result_message: 
-                 result_message += f"\nCode execution finished with return code: {process.returncode}"
-
-            return result_message.strip()
-
-        except subprocess.TimeoutExpired:
-            return "Error: Code execution timed out after 60 seconds."
-        except Exception as e:
-            return f"An unexpected error occurred during Python code execution: {str(e)}"
+        return self._execute(cleaned_code)
 
     async def _arun(self, code: str) -> str:
-      
-        return self._run(code)
+        """Async variant of `_run`: neither the confirmation prompt nor the code execution blocks the event loop.
+
+        When the agent issues several actions in one step, AgentExecutor gathers their `_arun` calls:
+        confirmations are asked one at a time, while the confirmed code runs in parallel on separate workers.
+        Their echoed output is held back while a proposal and its prompt are on screen.
+        """
+
+        cleaned_code = self._clean_code(code)
+
+        async with self._confirm_lock:
+            with ECHO.paused():
+                print("\n--- PROPOSED CLEANED CODE ---")
+                print(cleaned_code)
+                print("---------------------------\n")
+
+                if not cleaned_code:
+                    return "Error: No valid Python code provided after cleaning. The input might have been empty or only markdown."
+
+                if not self._is_approved(cleaned_code):
+                    confirm = await ainput("Do you want to execute this cleaned code? [y/N]: ")
+                    if confirm.lower() != 'y':
+                        return "Code execution CANCELED by user."
+                    self._approved.add(self._code_hash(cleaned_code))
+
+        return await asyncio.to_thread(self._execute, cleaned_code)
 
 #2. Initialize LLM and Tools
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
@@ -101,73 +173,78 @@ if not GROQ_API_KEY:
     print("Please create a .env file with GROQ_API_KEY='your_key_here'")
     sys.exit(1)
 
+# Identical prompts are answered from a local cache instead of another Groq request.
+# langchain_community is optional; without it the cache only lasts for the session.
+try:
+    from langchain_community.cache import SQLiteCache
+    set_llm_cache(SQLiteCache(database_path=".llm_cache.db"))
+except ImportError:
+    set_llm_cache(InMemoryCache())
+
+# All LLM round-trips share one pooled connection per client instead of paying TCP/TLS setup again;
+# HTTP/2 multiplexing is used when the optional `h2` package is installed.
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=8)
+http_client = httpx.Client(http2=HTTP2_AVAILABLE, limits=HTTP_LIMITS, timeout=60.0)
+http_async_client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=HTTP_LIMITS, timeout=60.0)
+atexit.register(http_client.close)
+
 try:
     llm = ChatGroq(
         temperature=0.05, 
-        model_name="llama3-8b-8192",
-        groq_api_key=GROQ_API_KEY
+        model_name="llama-3.1-8b-instant",
+        max_tokens=512,
+        groq_api_key=GROQ_API_KEY,
+        streaming=True,
+        callbacks=[StreamingStdOutCallbackHandler()],
+        http_client=http_client,
+        http_async_client=http_async_client
     )
    
-    llm.invoke("Respond with only 'OK'.") 
-    print("Groq LLM initialized and tested successfully.")
+    # Probing the API costs a round-trip and quota on every start; opt in with AGENT_HEALTHCHECK=1.
+    # The probe streams on purpose: that path skips the LLM cache, so it always reaches Groq.
+    if os.getenv("AGENT_HEALTHCHECK"):
+        for _ in llm.stream("Respond with only 'OK'."):
+            pass
+        print("Groq LLM initialized and tested successfully.")
 except Exception as e:
     print(f"Error initializing or testing Groq LLM: {e}")
     print("Please ensure your GROQ_API_KEY is correct and the model name is valid.")
     print("Check available models at https://console.groq.com/docs/models")
     sys.exit(1)
 
-tools: List[BaseTool] = [PythonCodeExecutorTool()]
+python_executor = PythonCodeExecutorTool()
+tools: List[BaseTool] = [python_executor]
 
-#3. Define the Agent Prompt for ReAct 
-REACT_PROMPT_TEMPLATE = """
+#3. Define the Agent Prompt
+# Tool names, descriptions and argument schemas reach the model through Groq's native tool-calling
+# parameters, so the prompt only carries the behavioural rules.
+SYSTEM_PROMPT = """
 You are a specialized AI assistant that generates and executes Python code to answer user requests.
 You MUST use the 'python_code_executor' tool to run any Python code.
 
-TOOLS:
-------
-You have access to the following tools:
-{tools}
-
-RESPONSE FORMAT:
---------------------
-Follow this strict format for your responses:
-
-Question: The user's request.
-Thought: Briefly explain your plan to address the question. If the task is complex, break it into smaller, runnable Python code steps. Each step's code should print its result or status.
-Action: The tool to use. This MUST be one of [{tool_names}].
-Action Input: The input for the tool.
-  - For 'python_code_executor', this MUST be ONLY the raw Python code.
-  - Do NOT include any explanations, comments outside the code, or markdown like ```python or ```.
-  - The Python code MUST be self-contained and print its output using `print()`.
-Observation: The result from the tool (this will be provided by the system).
-... (Repeat Thought/Action/Action Input/Observation as needed)
-Thought: I have all the information needed to answer the user.
-Final Answer: Provide the final answer to the user's question, based on the observations. If code was executed, summarize what it did and its output.
-
 IMPORTANT RULES:
-1.  Always use the `python_code_executor` for any Python execution.
-2.  The `Action Input` for `python_code_executor` must be ONLY raw Python code. No markdown, no fluff.
-3.  Ensure generated Python code prints its results.
+1.  Always use the `python_code_executor` tool for any Python execution.
+2.  The `code` argument must be ONLY raw Python code. No explanations, no markdown like ```python or ```.
+3.  The Python code MUST be self-contained and print its results using `print()`.
 4.  If a task is complex (e.g., building a game), generate code in smaller, verifiable steps.
+5.  Independent steps may be requested as several tool calls at once; they run in parallel.
+6.  Once you have all the information needed, answer the user directly. If code was executed, summarize what it did and its output.
 
 HANDLING USER CANCELLATION:
 ---------------------------
-If an Observation indicates "Code execution CANCELED by user":
-Thought: The user canceled the last proposed code. I should ask if they want to modify the code, try a different approach, or if I should abandon this line of inquiry for the current question.
-Action: (Decide if another tool use is appropriate, or if it's time for a Final Answer stating the cancellation)
-Action Input: (If applicable)
-Final Answer: (If abandoning, e.g., "User canceled code execution. How can I help further?")
-
-Begin!
-
-Question: {input}
-Thought:{agent_scratchpad}
+If a tool result says "Code execution CANCELED by user", do not retry the same code. Either try a different
+approach or answer that the user canceled code execution and ask how you can help further.
 """
 
-prompt = PromptTemplate.from_template(REACT_PROMPT_TEMPLATE)
+prompt = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_PROMPT),
+    ("human", "{input}"),
+    MessagesPlaceholder("agent_scratchpad")
+])
 
-#4. Create the ReAct Agent
-agent = create_react_agent(
+#4. Create the Tool-Calling Agent
+agent = create_tool_calling_agent(
     llm=llm,
     tools=tools,
     prompt=prompt
@@ -179,32 +256,63 @@ agent_executor = AgentExecutor(
     tools=tools,
     verbose=True,
     handle_parsing_errors=True,
-    max_iterations=10,        
-
+    max_iterations=5,
+    early_stopping_method="force",
+    # Streamed agent steps go through the chat model's astream path, which bypasses the LLM cache.
+    # Invoking each step instead checks the cache first and still streams tokens to stdout on a miss.
+    stream_runnable=False
 )
 
 #6. Main Interaction Loop
+async def run_turn(user_input: str) -> None:
+    """Streams one agent run and prints its final answer."""
+    async for chunk in agent_executor.astream({"input": user_input}):
+        if "output" in chunk:
+            print(f"\nAgent: {chunk['output']}")
+
 def main():
-    print("\nVerified Code Agent (Groq - Llama3-8B) Initialized.")
+    print("\nVerified Code Agent (Groq - Llama-3.1-8B) Initialized.")
     print("Type 'exit' to quit.")
     print("Agent will attempt to generate and execute Python code based on your prompts.")
     print("For complex tasks, the agent may need several steps or might not complete it perfectly in one go.")
     
-    while True:
-        user_input = input("\nUser: ")
-        if user_input.lower() == 'exit':
-            print("Exiting agent.")
-            break
-        if not user_input.strip():
-            continue
-
-        try:
-            response = agent_executor.invoke({"input": user_input})
-            print(f"\nAgent: {response['output']}")
-        except Exception as e:
-            print(f"\nAn error occurred during agent execution: {e}")
-            # import traceback 
-            # traceback.print_exc()
+    # The user prompt is read with a blocking input() outside the event loop, so Ctrl-C exits immediately.
+    # One loop is reused for every turn because the shared async HTTP client is bound to it.
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        while True:
+            user_input = input("\nUser: ")
+            if user_input.lower() == 'exit':
+                print("Exiting agent.")
+                break
+            if not user_input.strip():
+                continue
+
+            try:
+                loop.run_until_complete(run_turn(user_input))
+            except Exception as e:
+                print(f"\nAn error occurred during agent execution: {e}")
+                # import traceback 
+                # traceback.print_exc()
+    finally:
+        loop.run_until_complete(http_async_client.aclose())
+        loop.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Verified Code Agent")
+    parser.add_argument(
+        "--yes",
+        action="store_true",
+        help="Execute generated code without asking for confirmation (e.g. for CI)."
+    )
+    args = parser.parse_args()
+    python_executor.auto_approve = args.yes
+
+    if sys.platform == "linux":
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            pass
+    main()
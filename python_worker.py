@@ -0,0 +1,305 @@
+import os
+import sys
+import uuid
+import atexit
+import threading
+import subprocess
+import functools
+from collections import deque
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Iterator, List, Optional, Tuple, Deque
+
+# Runs inside the worker interpreter: imports the preload modules, then reads length-prefixed code blocks from
+# its stdin, executes each one in a fresh `__main__` module (so anything it defines can be pickled, as under
+# `python -c`) and terminates the output of every block with a marker line carrying the exit code. The marker
+# and preload list come from the environment so user code never sees them in sys.argv.
+# Like `python -c`, a block is finished only once the non-daemon threads it started have exited; afterwards
+# the standard streams, working directory, sys.path and recursion limit are reset and the marker is written
+# straight to fds 1 and 2, so redirections left behind by user code can neither swallow it nor leak into the
+# next block. Other interpreter state still carries over to later blocks on the same worker: imported and
+# monkeypatched modules, os.environ, signal handlers, daemon threads and the remaining sys settings.
+WORKER_BOOTSTRAP = r"""
+import os, sys, types, threading, traceback
+marker = os.environ.pop("AGENT_WORKER_MARKER")
+for name in os.environ.pop("AGENT_WORKER_PRELOAD", "").split(","):
+    try:
+        __import__(name)
+    except ImportError:
+        pass
+channel = os.fdopen(os.dup(0), "rb")
+devnull = os.open(os.devnull, os.O_RDONLY)
+os.dup2(devnull, 0)
+os.close(devnull)
+sys.stdout.reconfigure(encoding="utf-8", errors="replace")
+sys.stderr.reconfigure(encoding="utf-8", errors="replace")
+cwd = os.getcwd()
+path = list(sys.path)
+recursion_limit = sys.getrecursionlimit()
+worker_main = sys.modules["__main__"]
+while True:
+    header = channel.readline()
+    if not header:
+        break
+    source = channel.read(int(header)).decode("utf-8")
+    sys.argv = ["-c"]
+    threads = set(threading.enumerate())
+    main = types.ModuleType("__main__")
+    sys.modules["__main__"] = main
+    returncode = 0
+    try:
+        exec(compile(source, "<string>", "exec"), main.__dict__)
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            returncode = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            returncode = 1
+    except BaseException as e:
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        returncode = 1
+    for thread in threading.enumerate():
+        if thread not in threads and not thread.daemon:
+            thread.join()
+    sys.modules["__main__"] = worker_main
+    sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except ValueError:
+            pass
+    os.chdir(cwd)
+    sys.path[:] = path
+    sys.setrecursionlimit(recursion_limit)
+    end = f"\n{marker}{returncode}\n".encode()
+    os.write(1, end)
+    os.write(2, end)
+"""
+
+# Modules generated code commonly imports; the worker loads them once at spawn so blocks find them in sys.modules.
+# Kept to cheap stdlib modules: extra workers are spawned on demand for parallel calls and pay this at startup.
+WORKER_PRELOAD = ("json", "math", "random", "re", "statistics", "datetime", "collections", "itertools")
+
+# Only the tail of each stream is kept, so a runaway print loop cannot exhaust the agent's memory.
+OUTPUT_LIMIT = 64 * 1024
+
+class WorkerProtocolError(RuntimeError):
+    """Raised when the worker's output does not follow the end-of-block marker protocol."""
+
+class OutputTail:
+    """Keeps the last OUTPUT_LIMIT bytes written to one of the worker's streams."""
+
+    def __init__(self) -> None:
+        self._chunks: Deque[bytes] = deque()
+        self._size = 0
+        self._truncated = False
+
+    def append(self, chunk: bytes) -> None:
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+        while self._size - len(self._chunks[0]) >= OUTPUT_LIMIT:
+            self._size -= len(self._chunks.popleft())
+            self._truncated = True
+
+    def decode(self) -> str:
+        """Decodes the kept tail, dropping the newline the worker writes ahead of each marker."""
+        output = b"".join(self._chunks)
+        if output.endswith(b"\n"):
+            output = output[:-1]
+        truncated = self._truncated or len(output) > OUTPUT_LIMIT
+        text = output[-OUTPUT_LIMIT:].decode("utf-8", errors="replace")
+        return f"...[truncated]\n{text}" if truncated else text
+
+class EchoGate:
+    """Forwards echoed worker output to this process's streams, holding it back while a prompt is on screen.
+
+    Output held during a pause is capped at OUTPUT_LIMIT bytes; older chunks are dropped.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._paused = 0
+        self._held: Deque[Tuple[BinaryIO, bytes]] = deque()
+        self._held_size = 0
+        self._dropped = False
+
+    def write(self, stream: BinaryIO, data: bytes) -> None:
+        with self._lock:
+            if not self._paused:
+                stream.write(data)
+                stream.flush()
+                return
+            self._held.append((stream, data))
+            self._held_size += len(data)
+            while self._held_size > OUTPUT_LIMIT and len(self._held) > 1:
+                self._held_size -= len(self._held.popleft()[1])
+                self._dropped = True
+
+    @contextmanager
+    def paused(self) -> Iterator[None]:
+        """Holds echoed output back for the duration of the block, then writes it out."""
+        with self._lock:
+            self._paused += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._paused -= 1
+                if not self._paused:
+                    if self._dropped and self._held:
+                        self._held[0][0].write(b"...[truncated]\n")
+                    for stream, data in self._held:
+                        stream.write(data)
+                        stream.flush()
+                    self._held.clear()
+                    self._held_size = 0
+                    self._dropped = False
+
+# Shared by every worker so a single pause covers all code running in parallel.
+ECHO = EchoGate()
+
+class PythonWorker:
+    """A long-lived Python interpreter that executes code blocks sent over its stdin."""
+
+    def __init__(self) -> None:
+        self._marker = f"<<<END:{uuid.uuid4().hex}:"
+        self._lock = threading.Lock()
+        self._process: Optional[subprocess.Popen] = None
+        self._start()
+        atexit.register(self.close)
+
+    def _start(self) -> None:
+        # No shell, preexec_fn, cwd or credential changes: that keeps CPython (3.10+) on its vfork() spawn
+        # path on Linux, so respawning from the LangChain-sized parent does not copy its page tables.
+        self._process = subprocess.Popen(
+            [sys.executable, '-u', '-c', WORKER_BOOTSTRAP],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=dict(os.environ, AGENT_WORKER_MARKER=self._marker, AGENT_WORKER_PRELOAD=",".join(WORKER_PRELOAD)),
+            close_fds=True
+        )
+
+    def _read_block(self, stream, tail: OutputTail, echo: Optional[Callable[[bytes], None]] = None) -> Optional[int]:
+        """Collects lines until the end-of-block marker and returns its exit code, or None if the worker died.
+
+        The marker is only recognised at the start of a line. If `echo` is given, every line is also
+        passed to it as soon as it arrives, except that a bare newline is held back until the next line
+        shows it is not the one the worker writes ahead of the marker.
+        """
+        marker = self._marker.encode()
+        held_newline = False
+        for line in iter(lambda: stream.readline(OUTPUT_LIMIT), b""):
+            if line.startswith(marker):
+                try:
+                    return int(line[len(marker):])
+                except ValueError:
+                    raise WorkerProtocolError(f"Malformed end-of-block marker: {line!r}") from None
+            if echo is not None:
+                if held_newline:
+                    echo(b"\n")
+                held_newline = line == b"\n"
+                if not held_newline:
+                    echo(line)
+            tail.append(line)
+        if held_newline:
+            echo(b"\n")
+        return None
+
+    def execute(self, code: str, timeout: float, echo: bool = False) -> Tuple[str, str, int]:
+        """Runs `code` in the worker and returns (stdout, stderr, returncode); raises TimeoutExpired on timeout.
+
+        With `echo`, the output is also streamed to this process's stdout/stderr through ECHO while the code runs.
+        Any failure of the exchange leaves the pipes out of sync, so the worker is killed and respawned
+        on the next call.
+        """
+        with self._lock:
+            if self._process is None or self._process.poll() is not None:
+                self._start()
+            try:
+                return self._exchange(self._process, code, timeout, echo)
+            except BaseException:
+                self.close()
+                raise
+
+    def _exchange(self, process: subprocess.Popen, code: str, timeout: float, echo: bool) -> Tuple[str, str, int]:
+        payload = code.encode("utf-8")
+        process.stdin.write(b"%d\n" % len(payload) + payload)
+        process.stdin.flush()
+
+        stdout_tail = OutputTail()
+        stderr_tail = OutputTail()
+        stderr_errors: List[BaseException] = []
+        timed_out = threading.Event()
+
+        def expire() -> None:
+            timed_out.set()
+            process.kill()
+
+        def read_stderr() -> None:
+            try:
+                self._read_block(
+                    process.stderr, stderr_tail, functools.partial(ECHO.write, sys.stderr.buffer) if echo else None
+                )
+            except BaseException as e:
+                stderr_errors.append(e)
+                process.kill()
+
+        timer = threading.Timer(timeout, expire)
+        stderr_reader = threading.Thread(target=read_stderr)
+        timer.start()
+        stderr_reader.start()
+        try:
+            returncode = self._read_block(
+                process.stdout, stdout_tail, functools.partial(ECHO.write, sys.stdout.buffer) if echo else None
+            )
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            stderr_reader.join()
+            timer.cancel()
+
+        if stderr_errors:
+            raise stderr_errors[0]
+        if returncode is None:
+            # The worker exited mid-block (os._exit, a crash or the timeout kill); respawn it on the next call.
+            returncode = process.wait()
+            self._process = None
+            if timed_out.is_set():
+                raise subprocess.TimeoutExpired(process.args, timeout)
+
+        return stdout_tail.decode(), stderr_tail.decode(), returncode
+
+    def close(self) -> None:
+        """Stops the worker process."""
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+        self._process = None
+
+class WorkerPool:
+    """Hands out idle workers, spawning another one when every worker is busy, so concurrent calls run in parallel."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._idle: List[PythonWorker] = [PythonWorker()]
+
+    def execute(self, code: str, timeout: float, echo: bool = False) -> Tuple[str, str, int]:
+        """Runs `code` on an idle worker; see `PythonWorker.execute`."""
+        with self._lock:
+            worker = self._idle.pop() if self._idle else PythonWorker()
+        try:
+            result = worker.execute(code, timeout, echo)
+        except subprocess.TimeoutExpired:
+            self._release(worker)
+            raise
+        except BaseException:
+            # Any other failure may leave the worker's pipes out of sync; retire it instead of reusing it.
+            worker.close()
+            raise
+        self._release(worker)
+        return result
+
+    def _release(self, worker: PythonWorker) -> None:
+        with self._lock:
+            self._idle.append(worker)
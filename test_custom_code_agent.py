@@ -0,0 +1,37 @@
+import asyncio
+import importlib
+
+import pytest
+
+pytest.importorskip("langchain_groq")
+
+from langchain_core.caches import InMemoryCache
+from langchain_core.globals import set_llm_cache
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from langchain_groq import ChatGroq
+
+
+@pytest.fixture
+def agent_module(monkeypatch, tmp_path):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module("custom_code_agent")
+    set_llm_cache(InMemoryCache())
+    yield module
+    set_llm_cache(None)
+
+
+def test_repeated_prompt_is_served_from_the_llm_cache(agent_module, monkeypatch):
+    calls = []
+
+    async def fake_astream(self, messages, stop=None, run_manager=None, **kwargs):
+        calls.append(messages)
+        yield ChatGenerationChunk(message=AIMessageChunk(content="42"))
+
+    monkeypatch.setattr(ChatGroq, "_astream", fake_astream)
+
+    for _ in range(2):
+        response = asyncio.run(agent_module.agent_executor.ainvoke({"input": "What is 6 * 7?"}))
+        assert response["output"] == "42"
+    assert len(calls) == 1
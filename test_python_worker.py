@@ -0,0 +1,175 @@
+import io
+import sys
+import subprocess
+
+import pytest
+
+from python_worker import OUTPUT_LIMIT, EchoGate, OutputTail, PythonWorker, WorkerPool, WorkerProtocolError
+
+
+@pytest.fixture
+def worker():
+    worker = PythonWorker()
+    yield worker
+    worker.close()
+
+
+def test_executes_block_and_captures_streams(worker):
+    stdout, stderr, returncode = worker.execute("import sys\nprint('out')\nprint('err', file=sys.stderr)", 10)
+    assert (stdout, stderr, returncode) == ("out\n", "err\n", 0)
+
+
+def test_exception_traceback_and_exit_codes(worker):
+    stdout, stderr, returncode = worker.execute("raise ValueError('boom')", 10)
+    assert returncode == 1
+    assert stderr.startswith("Traceback") and "ValueError: boom" in stderr
+    assert worker.execute("import sys; sys.exit(3)", 10)[2] == 3
+
+
+def test_user_code_sees_plain_argv(worker):
+    assert worker.execute("import sys; print(sys.argv)", 10) == ("['-c']\n", "", 0)
+    assert worker.execute("import argparse; print(argparse.ArgumentParser().parse_args())", 10) == ("Namespace()\n", "", 0)
+
+
+def test_preload_modules_are_imported_without_touching_argv_or_environ(worker):
+    code = "import os, sys\nprint('statistics' in sys.modules, sys.argv, [k for k in os.environ if k.startswith('AGENT_WORKER')])"
+    assert worker.execute(code, 10) == ("True ['-c'] []\n", "", 0)
+
+
+def test_block_definitions_can_be_pickled(worker):
+    code = "import pickle\nclass A:\n    pass\nprint(type(pickle.loads(pickle.dumps(A()))).__name__)"
+    assert worker.execute(code, 10) == ("A\n", "", 0)
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="relies on the fork start method")
+def test_block_functions_work_with_multiprocessing(worker):
+    code = (
+        "import multiprocessing\n"
+        "def square(x):\n"
+        "    return x * x\n"
+        "with multiprocessing.Pool(2) as pool:\n"
+        "    print(pool.map(square, range(4)))"
+    )
+    assert worker.execute(code, 30) == ("[0, 1, 4, 9]\n", "", 0)
+
+
+def test_blocks_do_not_see_each_others_output(worker):
+    worker.execute("raise ValueError('e2')", 10)
+    assert worker.execute("print('three')", 10) == ("three\n", "", 0)
+
+
+def test_timeout_kills_and_respawns_worker(worker):
+    with pytest.raises(subprocess.TimeoutExpired):
+        worker.execute("import time; time.sleep(30)", 0.5)
+    assert worker.execute("print('alive')", 10) == ("alive\n", "", 0)
+
+
+def test_malformed_marker_is_a_protocol_error(worker):
+    stream = io.BytesIO(worker._marker.encode() + b"not-a-code\n")
+    with pytest.raises(WorkerProtocolError):
+        worker._read_block(stream, OutputTail())
+
+
+def test_echo_skips_the_newline_written_ahead_of_the_marker(worker):
+    marker = worker._marker.encode()
+    echo = io.BytesIO()
+    stream = io.BytesIO(b"child\n\n\n" + marker + b"0\n")
+    assert worker._read_block(stream, OutputTail(), echo.write) == 0
+    assert echo.getvalue() == b"child\n\n"
+
+    echo = io.BytesIO()
+    assert worker._read_block(io.BytesIO(b"\n" + marker + b"0\n"), OutputTail(), echo.write) == 0
+    assert echo.getvalue() == b""
+
+
+def test_echo_gate_holds_output_while_paused():
+    gate = EchoGate()
+    stream = io.BytesIO()
+    gate.write(stream, b"before\n")
+    with gate.paused():
+        gate.write(stream, b"during\n")
+        assert stream.getvalue() == b"before\n"
+    assert stream.getvalue() == b"before\nduring\n"
+
+
+def test_echo_gate_caps_held_output():
+    gate = EchoGate()
+    stream = io.BytesIO()
+    with gate.paused():
+        for chunk in (b"a", b"b", b"c"):
+            gate.write(stream, chunk * (OUTPUT_LIMIT // 2))
+    assert stream.getvalue() == b"...[truncated]\n" + b"b" * (OUTPUT_LIMIT // 2) + b"c" * (OUTPUT_LIMIT // 2)
+
+
+def test_reader_failure_drops_the_worker(worker, monkeypatch):
+    process = worker._process
+
+    def broken_read_block(*args, **kwargs):
+        raise WorkerProtocolError("broken")
+
+    monkeypatch.setattr(worker, "_read_block", broken_read_block)
+    with pytest.raises(WorkerProtocolError):
+        worker.execute("print('x')", 10)
+    assert worker._process is None
+    assert process.poll() is not None
+
+    monkeypatch.undo()
+    assert worker.execute("print('fresh')", 10) == ("fresh\n", "", 0)
+
+
+def test_output_is_capped_and_marked_truncated(worker):
+    stdout, _, _ = worker.execute("for i in range(100000): print(i)", 30)
+    assert stdout.startswith("...[truncated]\n")
+    assert stdout.endswith("99999\n")
+
+
+def test_pool_runs_code():
+    pool = WorkerPool()
+    assert pool.execute("print(6 * 7)", 10) == ("42\n", "", 0)
+
+
+def test_block_waits_for_its_threads(worker):
+    code = "import threading, time\nthreading.Thread(target=lambda: (time.sleep(0.2), print('LATE'))).start()"
+    assert worker.execute(code, 10) == ("LATE\n", "", 0)
+    assert worker.execute("print('next')", 10) == ("next\n", "", 0)
+
+
+def test_working_directory_is_restored(worker, tmp_path):
+    cwd = worker.execute("import os; print(os.getcwd())", 10)[0]
+    worker.execute(f"import os; os.chdir({str(tmp_path)!r})", 10)
+    assert worker.execute("import os; print(os.getcwd())", 10)[0] == cwd
+
+
+def test_sys_path_and_recursion_limit_are_restored(worker):
+    worker.execute("import sys\nsys.path.insert(0, '/block-only')\nsys.setrecursionlimit(50)", 10)
+    code = "import sys\ndef depth(n):\n    return n and depth(n - 1)\ndepth(200)\nprint('/block-only' in sys.path)"
+    assert worker.execute(code, 10) == ("False\n", "", 0)
+
+
+def test_stream_redirects_do_not_hide_the_marker(worker):
+    code = "import os, sys\nsys.stdout = open(os.devnull, 'w')\nsys.stderr = open(os.devnull, 'w')\nprint('hidden')"
+    assert worker.execute(code, 5) == ("", "", 0)
+    assert worker.execute("print('visible')", 5) == ("visible\n", "", 0)
+
+
+def test_pool_retires_a_worker_that_failed(monkeypatch):
+    pool = WorkerPool()
+    broken = pool._idle[0]
+
+    def fail(*args, **kwargs):
+        raise BrokenPipeError()
+
+    monkeypatch.setattr(broken, "execute", fail)
+    with pytest.raises(BrokenPipeError):
+        pool.execute("print('x')", 10)
+    assert pool._idle == []
+    assert pool.execute("print('ok')", 10) == ("ok\n", "", 0)
+    assert broken not in pool._idle
+
+
+def test_pool_keeps_a_worker_after_timeout():
+    pool = WorkerPool()
+    worker = pool._idle[0]
+    with pytest.raises(subprocess.TimeoutExpired):
+        pool.execute("import time; time.sleep(30)", 0.5)
+    assert pool._idle == [worker]